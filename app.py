@@ -1,5 +1,20 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+import click
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
 
 # Optional: OR-Tools für echte TSP-Optimierung
@@ -9,13 +24,66 @@ try:
 except ImportError:
     HAS_OR_TOOLS = False
 
+# Optional: Numba für 2-opt-Nachoptimierung und Held-Karp
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """Ersatz ohne Numba: Funktion läuft als normales Python."""
+        def decorator(func):
+            return func
+        return decorator
+
+# Optional: orjson für schnelle JSON-Serialisierung (sonst Flask-JSON)
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Optional: httpx mit HTTP/2 für eigene Nominatim-Instanzen
+try:
+    import httpx
+    # http2=True benötigt zusätzlich das Paket h2 (httpx[http2])
+    HAS_HTTPX = importlib.util.find_spec("h2") is not None
+except ImportError:
+    HAS_HTTPX = False
+
+# Optional: gzip/brotli-Kompression der Antworten
+try:
+    from flask_compress import Compress
+    HAS_COMPRESS = True
+except ImportError:
+    HAS_COMPRESS = False
+
+# Optional: Redis als persistenter Cache (sonst SQLite-Datei neben der App)
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
 app = Flask(__name__)
 
+# JSON-Antworten (Route als GeoJSON) komprimiert ausliefern
+app.config["COMPRESS_MIMETYPES"] = ["application/json", "application/geo+json"]
+app.config["COMPRESS_LEVEL"] = 6
+if HAS_COMPRESS:
+    Compress(app)
+
 # Kontaktinfo für Nominatim (Pflicht laut Nutzungsbedingungen)
 CONTACT_EMAIL = "maxmontana@hotmail.de"
 
-# OpenStreetMap Nominatim Geocoding
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+# OpenStreetMap Nominatim Geocoding (eigene Instanz per NOMINATIM_URL möglich)
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+
+# Öffentliches Nominatim erlaubt max. 1 Anfrage pro Sekunde, eigene Instanzen mehr
+NOMINATIM_PUBLIC = "nominatim.openstreetmap.org" in NOMINATIM_URL
+NOMINATIM_MIN_INTERVAL = 1.0 if NOMINATIM_PUBLIC else 0.0
+GEOCODE_WORKERS = 4 if NOMINATIM_PUBLIC else 8
 
 # Öffentlicher OSRM-Routingserver
 OSRM_BASE_URL = "https://router.project-osrm.org"
@@ -24,6 +92,174 @@ OSRM_BASE_URL = "https://router.project-osrm.org"
 START_ADDRESS = "Aleksis-Kivi-Straße 1, 18106 Rostock, Deutschland"
 START_COORD = None  # wird beim ersten Aufruf ermittelt und gecached
 
+# Gemeinsame HTTP-Session (Keep-Alive, Retries) und Thread-Pool für parallele Anfragen
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = (429, 502, 503, 504)
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS,
+        raise_on_status=False  # letzte Antwort zurückgeben, 429 meldet geocode_address
+    )
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+SESSION.headers.update({"User-Agent": f"UwesRoutenplaner/1.0 ({CONTACT_EMAIL})"})
+EXECUTOR = ThreadPoolExecutor(max_workers=GEOCODE_WORKERS)
+
+# Eigene Nominatim-Instanz: parallele Anfragen der Worker über eine HTTP/2-Verbindung
+# multiplexen. Beim öffentlichen Server laufen die Anfragen ohnehin nacheinander.
+# httpx handelt HTTP/2 nur per TLS (ALPN) aus, für http:// bleibt es bei SESSION.
+NOMINATIM_HTTP2 = HAS_HTTPX and not NOMINATIM_PUBLIC and NOMINATIM_URL.startswith("https://")
+if NOMINATIM_HTTP2:
+    NOMINATIM_CLIENT = httpx.Client(
+        transport=httpx.HTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=16),
+            retries=RETRY_TOTAL  # nur Verbindungsfehler, Status-Retries in nominatim_get
+        ),
+        headers={"User-Agent": f"UwesRoutenplaner/1.0 ({CONTACT_EMAIL})"},
+        timeout=10
+    )
+else:
+    NOMINATIM_CLIENT = SESSION
+_nominatim_lock = threading.Semaphore(1)
+_nominatim_last_call = 0.0
+
+# Persistenter Cache für Geocoding, OSRM-Matrizen und Antworten (Redis, Fallback SQLite)
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+CACHE_DB_PATH = os.environ.get(
+    "CACHE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.sqlite3")
+)
+GEOCODE_CACHE_TTL = 60 * 60 * 24 * 30  # 30 Tage
+OPTIMIZE_CACHE_TTL = 60 * 60  # 1 Stunde
+OSRM_TABLE_CACHE_TTL = 60 * 60 * 24  # 1 Tag
+CACHE_ERRORS = (sqlite3.Error, redis.RedisError) if HAS_REDIS else (sqlite3.Error,)
+
+
+def _connect_redis():
+    """Redis-Verbindung aufbauen, None wenn nicht installiert oder nicht erreichbar."""
+    if not HAS_REDIS:
+        return None
+    try:
+        client = redis.Redis.from_url(REDIS_URL, socket_timeout=1)
+        client.ping()
+        return client
+    except redis.RedisError:
+        return None
+
+
+def _init_sqlite_cache():
+    """SQLite-Cache anlegen und abgelaufene Einträge löschen; False wenn nicht nutzbar."""
+    try:
+        with closing(sqlite3.connect(CACHE_DB_PATH, timeout=5)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        return True
+    except sqlite3.Error:
+        return False
+
+
+REDIS_CLIENT = _connect_redis()
+# Weder Redis noch SQLite nutzbar -> App läuft ohne Cache
+CACHE_DISABLED = REDIS_CLIENT is None and not _init_sqlite_cache()
+
+
+def cache_get(key):
+    """Wert (bytes) aus dem Cache holen, None bei Miss oder Cache-Fehler."""
+    if CACHE_DISABLED:
+        return None
+    try:
+        if REDIS_CLIENT is not None:
+            return REDIS_CLIENT.get(key)
+        with closing(sqlite3.connect(CACHE_DB_PATH, timeout=5)) as conn:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?",
+                (key, time.time())
+            ).fetchone()
+        return bytes(row[0]) if row else None
+    except CACHE_ERRORS:
+        return None
+
+
+def cache_set(key, value, ttl):
+    """Wert (str oder bytes) mit TTL in Sekunden speichern; Cache-Fehler werden ignoriert."""
+    if CACHE_DISABLED:
+        return
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    try:
+        if REDIS_CLIENT is not None:
+            REDIS_CLIENT.set(key, value, ex=ttl)
+            return
+        with closing(sqlite3.connect(CACHE_DB_PATH, timeout=5)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+    except CACHE_ERRORS:
+        pass
+
+
+def cache_clear(prefix):
+    """Alle Cache-Einträge mit dem Präfix (z.B. "opt:") entfernen."""
+    if CACHE_DISABLED:
+        return
+    try:
+        if REDIS_CLIENT is not None:
+            for key in REDIS_CLIENT.scan_iter(match=prefix + "*"):
+                REDIS_CLIENT.delete(key)
+            return
+        with closing(sqlite3.connect(CACHE_DB_PATH, timeout=5)) as conn, conn:
+            conn.execute("DELETE FROM cache WHERE key LIKE ?", (prefix + "%",))
+    except CACHE_ERRORS:
+        pass
+
+
+def geocode_cache_lookup(norm_key):
+    """Gecachte (lat, lon) zum normalisierten Adress-Schlüssel, sonst None."""
+    cached = cache_get("geo:" + norm_key)
+    if cached is None:
+        return None
+    lat, lon = json.loads(cached)
+    return lat, lon
+
+
+def geocode_cache_store(norm_key, coord):
+    """(lat, lon) unter dem normalisierten Adress-Schlüssel speichern."""
+    cache_set("geo:" + norm_key, json.dumps(list(coord)), GEOCODE_CACHE_TTL)
+
+
+def cached_geocode(func):
+    """Geocoding-Ergebnisse unter der normalisierten Adresse cachen."""
+    @functools.wraps(func)
+    def wrapper(address):
+        norm_key = norm_for_match(address)
+        coord = geocode_cache_lookup(norm_key)
+        if coord is not None:
+            return coord
+        coord = func(address)
+        geocode_cache_store(norm_key, coord)
+        return coord
+    return wrapper
+
+
+# Vorkompilierte Muster für die Adress-Normalisierung
+_RE_STR_DOT = re.compile(r'\bstr\.\b', re.IGNORECASE)
+_RE_STR = re.compile(r'\bstr\b', re.IGNORECASE)
+_RE_STRASSE = re.compile(r'strasse', re.IGNORECASE)
+_RE_WS = re.compile(r'\s+')
+_RE_PLZ_CITY = re.compile(r'^(\d{4,5})\s+(.+)$')
+
 
 def normalize_address_string(address: str) -> str:
     """
@@ -32,45 +268,95 @@ def normalize_address_string(address: str) -> str:
     - strasse -> straße
     """
     a = address
-    a = re.sub(r'\bstr\.\b', 'straße', a, flags=re.IGNORECASE)
-    a = re.sub(r'\bstr\b', 'straße', a, flags=re.IGNORECASE)
-    a = re.sub(r'strasse', 'straße', a, flags=re.IGNORECASE)
+    a = _RE_STR_DOT.sub('straße', a)
+    a = _RE_STR.sub('straße', a)
+    a = _RE_STRASSE.sub('straße', a)
     return a
 
 
 def norm_for_match(s: str) -> str:
     """Normalisierung für Adressvergleiche (Case-insensitive, Leerzeichen vereinheitlichen)."""
-    return re.sub(r'\s+', ' ', normalize_address_string(s).strip().lower())
+    return _RE_WS.sub(' ', normalize_address_string(s).strip().lower())
+
+
+def nominatim_get(params):
+    """Nominatim-Anfrage, beim öffentlichen Server auf 1 Anfrage/Sekunde gedrosselt."""
+    global _nominatim_last_call
+    if NOMINATIM_HTTP2:
+        # Gleiche Status-Retries mit Backoff wie der HTTPAdapter von SESSION
+        for attempt in range(RETRY_TOTAL):
+            r = NOMINATIM_CLIENT.get(NOMINATIM_URL, params=params, timeout=10)
+            if r.status_code not in RETRY_STATUS:
+                return r
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        return NOMINATIM_CLIENT.get(NOMINATIM_URL, params=params, timeout=10)
+    if not NOMINATIM_MIN_INTERVAL:
+        return SESSION.get(NOMINATIM_URL, params=params, timeout=10)
+
+    with _nominatim_lock:
+        wait = _nominatim_last_call + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            return SESSION.get(NOMINATIM_URL, params=params, timeout=10)
+        finally:
+            _nominatim_last_call = time.monotonic()
+
+
+def nominatim_search(params):
+    """Nominatim-Suche ausführen und Trefferliste zurückgeben."""
+    r = nominatim_get(params)
+    if r.status_code == 429:
+        raise ValueError("Nominatim: Zu viele Anfragen (429). Bitte kurz warten.")
+    r.raise_for_status()
+    return r.json()
+
+
+def parse_address_components(address):
+    """
+    "Straße 1, PLZ Ort[, Land]" in strukturierte Nominatim-Parameter zerlegen.
+    Gibt None zurück, wenn die Adresse nicht in dieses Schema passt.
+    """
+    parts = [p.strip() for p in address.split(",")]
+    if len(parts) not in (2, 3) or not all(parts):
+        return None
+
+    m = _RE_PLZ_CITY.match(parts[1])
+    if not m:
+        return None
+
+    components = {"street": parts[0], "postalcode": m.group(1), "city": m.group(2)}
+    if len(parts) == 3:
+        components["country"] = parts[2]
+    return components
 
 
+@cached_geocode
 def geocode_address(address):
     """Adresse -> (lat, lon) via Nominatim, mit einfacher Fuzzy-Normalisierung."""
+    data = []
+
+    # 1. Versuch: strukturierte Suche (schnellerer, indexbasierter Pfad bei Nominatim)
+    components = parse_address_components(address)
+    if components:
+        data = nominatim_search({**components, "format": "json", "limit": 1})
+
     params = {
         "q": address,
         "format": "json",
         "limit": 1
     }
-    headers = {
-        "User-Agent": f"UwesRoutenplaner/1.0 ({CONTACT_EMAIL})"
-    }
 
-    # 1. Versuch: Originaladresse
-    r = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=10)
-    if r.status_code == 429:
-        raise ValueError("Nominatim: Zu viele Anfragen (429). Bitte kurz warten.")
-    r.raise_for_status()
-    data = r.json()
+    # 2. Versuch: Freitextsuche mit Originaladresse
+    if not data:
+        data = nominatim_search(params)
 
     # Wenn nichts gefunden, mit normalisierter Adresse versuchen
     if not data:
         normalized = normalize_address_string(address)
         if normalized.lower() != address.lower():
             params["q"] = normalized
-            r2 = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=10)
-            if r2.status_code == 429:
-                raise ValueError("Nominatim: Zu viele Anfragen (429). Bitte kurz warten.")
-            r2.raise_for_status()
-            data = r2.json()
+            data = nominatim_search(params)
 
     if not data:
         raise ValueError(f"Keine Geodaten für Adresse: {address}")
@@ -80,8 +366,15 @@ def geocode_address(address):
     return lat, lon
 
 
+def geocode_cache_miss(address, norm_key):
+    """Bekannten Cache-Miss geocodieren und speichern, ohne erneuten Cache-Lookup."""
+    coord = geocode_address.__wrapped__(address)
+    geocode_cache_store(norm_key, coord)
+    return coord
+
+
 def ensure_start_coord():
-    """Startkoordinaten einmal holen und dann cachen."""
+    """Startkoordinaten einmal holen und im Prozess merken (auch ohne nutzbaren Cache)."""
     global START_COORD
     if START_COORD is None:
         START_COORD = geocode_address(START_ADDRESS)
@@ -89,47 +382,78 @@ def ensure_start_coord():
 
 
 def get_osrm_table(coords):
-    """Matrix (Zeit & Distanz) von OSRM holen."""
+    """Matrix (Zeit & Distanz) von OSRM als float64-Arrays holen (None -> NaN)."""
     if len(coords) < 2:
         raise ValueError("Mindestens zwei Koordinaten erforderlich.")
 
+    # Cache-Schlüssel über die Koordinaten in Reihenfolge (Zeilen/Spalten hängen davon ab)
+    n = len(coords)
+    cache_key = "osrm_tab:" + hashlib.sha1(
+        ";".join(f"{lon:.5f},{lat:.5f}" for lat, lon in coords).encode("utf-8")
+    ).hexdigest()
+    cached = cache_get(cache_key)
+    if cached is not None:
+        matrices = np.frombuffer(zlib.decompress(cached), dtype=np.float64).reshape(2, n, n)
+        return matrices[0].copy(), matrices[1].copy()
+
     coord_str = ";".join([f"{lon},{lat}" for lat, lon in coords])
     url = f"{OSRM_BASE_URL}/table/v1/driving/{coord_str}"
     params = {"annotations": "duration,distance"}
 
-    r = requests.get(url, params=params, timeout=20)
+    r = SESSION.get(url, params=params, timeout=20)
     r.raise_for_status()
     data = r.json()
 
     if "durations" not in data or "distances" not in data:
         raise ValueError("OSRM-Table-Antwort unvollständig.")
 
-    return data["distances"], data["durations"]
+    distances = np.array(data["distances"], dtype=np.float64)
+    durations = np.array(data["durations"], dtype=np.float64)
+    packed = zlib.compress(np.stack((distances, durations)).tobytes())
+    cache_set(cache_key, packed, OSRM_TABLE_CACHE_TTL)
+    return distances, durations
 
 
-def greedy_tsp(distance_matrix, roundtrip=True):
-    """Einfacher Greedy-Algorithmus für TSP-Lösung (Index 0 = Depot)."""
-    n = len(distance_matrix)
+# Ersatzkosten für nicht erreichbare Verbindungen (NaN aus OSRM). Ganzzahlig und so
+# gewählt, dass auch Tour-Summen über tausende solcher Kanten exakt in int64 passen.
+UNREACHABLE_COST = 1e12
+
+
+def cost_matrix(distances):
+    """
+    OSRM-Distanzen einmalig in die endliche float64-Kostenmatrix für alle Solver umwandeln.
+    Summen mit UNREACHABLE_COST sind in float64 nicht exakt; wer Kostendifferenzen
+    vergleicht (2-opt, OR-Tools), rechnet daher auf der int64-Kopie.
+    """
+    return np.nan_to_num(
+        np.asarray(distances, dtype=np.float64),
+        nan=UNREACHABLE_COST, posinf=UNREACHABLE_COST
+    )
+
+
+def greedy_tsp(distance_matrix, roundtrip=True, first_stop_idx=None):
+    """
+    Einfacher Greedy-Algorithmus für TSP-Lösung (Index 0 = Depot), erwartet wie alle
+    Solver eine endliche Kostenmatrix aus cost_matrix().
+    Mit first_stop_idx wird dieser Knoten als erster Stopp nach dem Depot gesetzt.
+    """
+    dist = np.asarray(distance_matrix, dtype=np.float64)
+    n = len(dist)
     if n == 0:
         return []
 
-    visited = [False] * n
+    visited = np.zeros(n, dtype=bool)
     path = [0]
     visited[0] = True
+    if first_stop_idx is not None:
+        path.append(first_stop_idx)
+        visited[first_stop_idx] = True
 
-    for _ in range(n - 1):
-        last = path[-1]
-        next_idx = None
-        best_dist = float("inf")
+    for _ in range(n - len(path)):
+        row = np.where(visited, np.inf, dist[path[-1]])
+        next_idx = int(row.argmin())
 
-        for j in range(n):
-            if not visited[j]:
-                d = distance_matrix[last][j]
-                if d is not None and d < best_dist:
-                    best_dist = d
-                    next_idx = j
-
-        if next_idx is None:
+        if row[next_idx] == np.inf:
             break
 
         visited[next_idx] = True
@@ -141,8 +465,124 @@ def greedy_tsp(distance_matrix, roundtrip=True):
     return path
 
 
-def ortools_tsp(distance_matrix, roundtrip=True):
-    """Echte TSP-Optimierung mit OR-Tools (Index 0 = Depot)."""
+@njit(cache=True, fastmath=True)
+def _two_opt(tour, dist, first):
+    """
+    2-opt (First Improvement) auf einer geschlossenen Tour.
+    Positionen vor `first` und der letzte Knoten bleiben fest. Da OSRM-Matrizen
+    asymmetrisch sind, wird der umgedrehte Abschnitt über Präfixsummen
+    in Vorwärts- und Rückwärtsrichtung neu bewertet. Ganzzahlige Kosten (int64)
+    halten die Summen exakt, sodass kostenneutrale Umkehrungen nie als
+    Verbesserung gelten und die Suche sicher endet.
+    """
+    n = tour.shape[0]
+    fwd = np.zeros(n, dtype=np.int64)
+    bwd = np.zeros(n, dtype=np.int64)
+    for k in range(1, n):
+        fwd[k] = fwd[k - 1] + dist[tour[k - 1], tour[k]]
+        bwd[k] = bwd[k - 1] + dist[tour[k], tour[k - 1]]
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(first, n - 2):
+            for j in range(i + 1, n - 1):
+                a = tour[i - 1]
+                b = tour[i]
+                c = tour[j]
+                d = tour[j + 1]
+                delta = (dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+                         + (bwd[j] - bwd[i]) - (fwd[j] - fwd[i]))
+                if delta < 0:
+                    tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                    for k in range(i, n):
+                        fwd[k] = fwd[k - 1] + dist[tour[k - 1], tour[k]]
+                        bwd[k] = bwd[k - 1] + dist[tour[k], tour[k - 1]]
+                    improved = True
+    return tour
+
+
+def two_opt_tsp(path, distance_matrix, first=1):
+    """
+    Tour (z.B. aus greedy_tsp) per 2-opt verbessern.
+    Die ersten `first` Knoten und das Ende bleiben fest (first=2 hält den festen ersten Stopp).
+    """
+    if len(path) < 4:
+        return path
+
+    # Auf ganze Meter gerundet, damit die Präfixsummen exakt bleiben
+    dist = np.rint(np.asarray(distance_matrix, dtype=np.float64)).astype(np.int64)
+    tour = np.array(path, dtype=np.int64)
+    return _two_opt(tour, dist, first).tolist()
+
+
+# Bis zu dieser Knotenzahl (inkl. Depot) wird exakt per Held-Karp gelöst;
+# ohne Numba läuft die DP als reines Python und bleibt daher kleiner
+HELD_KARP_MAX_NODES = 15 if HAS_NUMBA else 8
+
+
+@njit(cache=True)
+def _held_karp(dist, first):
+    """
+    Bitmask-DP: dp[S, i] = minimale Kosten vom Depot 0 durch die Knotenmenge S bis i.
+    Mit first >= 0 beginnt jede Tour mit der Kante 0 -> first.
+    """
+    n = dist.shape[0]
+    full = 1 << n
+    dp = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int8)
+    if first >= 0:
+        dp[1 | (1 << first), first] = dist[0, first]
+        parent[1 | (1 << first), first] = 0
+    else:
+        dp[1, 0] = 0.0
+
+    for S in range(1, full, 2):
+        for i in range(n):
+            cost = dp[S, i]
+            if cost == np.inf:
+                continue
+            for j in range(1, n):
+                if S & (1 << j):
+                    continue
+                T = S | (1 << j)
+                c = cost + dist[i, j]
+                if c < dp[T, j]:
+                    dp[T, j] = c
+                    parent[T, j] = i
+
+    # Rückkehr zum Depot schließen
+    last = 1
+    best = np.inf
+    for i in range(1, n):
+        c = dp[full - 1, i] + dist[i, 0]
+        if c < best:
+            best = c
+            last = i
+
+    tour = np.zeros(n + 1, dtype=np.int64)
+    S = full - 1
+    i = last
+    for k in range(n - 1, 0, -1):
+        tour[k] = i
+        p = int(parent[S, i])
+        S ^= 1 << i
+        i = p
+    return tour
+
+
+def held_karp_tsp(distance_matrix, first_stop_idx=None):
+    """Optimale Rundtour ab/bis Depot 0 für kleine n (Held-Karp, O(2^n * n^2))."""
+    dist = np.asarray(distance_matrix, dtype=np.float64)
+    first = -1 if first_stop_idx is None else first_stop_idx
+    return _held_karp(dist, first).tolist()
+
+
+def ortools_tsp(distance_matrix, roundtrip=True, first_stop_idx=None):
+    """
+    Echte TSP-Optimierung mit OR-Tools (Index 0 = Depot).
+    Mit first_stop_idx wird die erste Kante Depot -> first_stop_idx fest vorgegeben.
+    """
     if not HAS_OR_TOOLS:
         return None
 
@@ -151,9 +591,8 @@ def ortools_tsp(distance_matrix, roundtrip=True):
         return [0]
 
     data = {}
-    data["distance_matrix"] = [
-        [int(d if d is not None else 0) for d in row] for row in distance_matrix
-    ]
+    # Einzige Umwandlung in Python-Listen: int64-Kopie für RegisterTransitMatrix
+    data["distance_matrix"] = np.asarray(distance_matrix).astype(np.int64).tolist()
     data["num_vehicles"] = 1
     data["depot"] = 0
 
@@ -164,22 +603,23 @@ def ortools_tsp(distance_matrix, roundtrip=True):
     )
     routing = pywrapcp.RoutingModel(manager)
 
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data["distance_matrix"][from_node][to_node]
-
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    # Matrix einmalig an C++ übergeben, keine Python-Callbacks pro Kante
+    transit_callback_index = routing.RegisterTransitMatrix(data["distance_matrix"])
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
 
+    if first_stop_idx is not None:
+        routing.solver().Add(
+            routing.NextVar(routing.Start(0)) == manager.NodeToIndex(first_stop_idx)
+        )
+
+    # Startlösung wählt OR-Tools selbst (AUTOMATIC), danach Guided Local Search
     search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    )
     search_parameters.local_search_metaheuristic = (
         routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
     )
-    search_parameters.time_limit.FromSeconds(5)
+    # Zeitbudget wächst mit der Problemgröße: 200 ms pro Knoten, max. 5 s. OR-Tools
+    # bekommt nur Touren oberhalb von HELD_KARP_MAX_NODES (16-26 Knoten mit Numba)
+    search_parameters.time_limit.FromMilliseconds(min(5000, 200 * n))
 
     solution = routing.SolveWithParameters(search_parameters)
 
@@ -202,18 +642,20 @@ def ortools_tsp(distance_matrix, roundtrip=True):
     return route
 
 
-def get_osrm_route(coords, order):
-    """Route-Geometrie für die berechnete Reihenfolge holen."""
+def get_osrm_route(coords, order, overview="simplified"):
+    """Route-Geometrie für die berechnete Reihenfolge holen (overview="full" für alle Punkte)."""
     ordered_coords = [coords[i] for i in order]
     coord_str = ";".join([f"{lon},{lat}" for lat, lon in ordered_coords])
 
     url = f"{OSRM_BASE_URL}/route/v1/driving/{coord_str}"
     params = {
-        "overview": "full",  # ggf. "simplified" für kleinere GeoJSONs
-        "geometries": "geojson"
+        "overview": overview,  # "simplified" reicht für die Kartenanzeige
+        "geometries": "geojson",
+        "steps": "false",
+        "alternatives": "false"
     }
 
-    r = requests.get(url, params=params, timeout=25)
+    r = SESSION.get(url, params=params, timeout=25)
     r.raise_for_status()
     data = r.json()
 
@@ -223,6 +665,15 @@ def get_osrm_route(coords, order):
     return data["routes"][0]
 
 
+def ojson(obj, status=200):
+    """JSON-Antwort erzeugen, per orjson serialisiert wenn verfügbar."""
+    if HAS_ORJSON:
+        body = orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        body = app.json.dumps(obj)
+    return Response(body, status=status, mimetype="application/json")
+
+
 @app.route("/")
 def index():
     return render_template("index.html", start_address=START_ADDRESS)
@@ -236,76 +687,101 @@ def optimize():
 
     # Variante C: Fester erster Stopp ist Pflicht
     if not fixed_start_raw:
-        return jsonify({"error": "Bitte einen festen ersten Stopp angeben."}), 400
+        return ojson({"error": "Bitte einen festen ersten Stopp angeben."}, 400)
 
     # Ziel-Adressen Zeile für Zeile (Rohliste)
     raw_addresses = [a.strip() for a in addresses_raw.split("\n") if a.strip()]
+    # Normalisierte Schlüssel einmal berechnen und parallel zu den Adressen mitführen
+    raw_keys = [norm_for_match(a) for a in raw_addresses]
 
     # Wenn der feste erste Stopp noch nicht in der Liste vorkommt, automatisch hinzufügen
     norm_fixed = norm_for_match(fixed_start_raw)
-    if all(norm_for_match(a) != norm_fixed for a in raw_addresses):
+    if norm_fixed not in raw_keys:
         raw_addresses.insert(0, fixed_start_raw)
+        raw_keys.insert(0, norm_fixed)
 
     if len(raw_addresses) < 1:
-        return jsonify({"error": "Bitte mindestens eine Ziel-Adresse eingeben."}), 400
+        return ojson({"error": "Bitte mindestens eine Ziel-Adresse eingeben."}, 400)
 
     # Dubletten erkennen & entfernen (normalisiert)
     seen = set()
     user_addresses = []
+    norm_keys = []
     duplicates = []
 
-    for addr in raw_addresses:
-        key = norm_for_match(addr)
+    for addr, key in zip(raw_addresses, raw_keys):
         if key in seen:
             duplicates.append(addr)
         else:
             seen.add(key)
             user_addresses.append(addr)
+            norm_keys.append(key)
 
     if len(user_addresses) < 1:
-        return jsonify({"error": "Nach Entfernen der Dubletten blieb keine Adresse übrig."}), 400
+        return ojson({"error": "Nach Entfernen der Dubletten blieb keine Adresse übrig."}, 400)
+
+    # Gleiche Eingabe (normalisiert, Reihenfolge egal) -> fertige Antwort aus dem Cache
+    cache_key = "opt:" + hashlib.sha1((
+        "|".join(sorted(raw_keys)) + "||" + norm_fixed
+    ).encode("utf-8")).hexdigest()
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return Response(cached, mimetype="application/json")
 
     # Startpunkt holen
     try:
         start_lat, start_lon = ensure_start_coord()
     except Exception as e:
-        return jsonify({"error": f"Fehler beim Startpunkt-Geocoding: {e}"}), 500
+        return ojson({"error": f"Fehler beim Startpunkt-Geocoding: {e}"}, 500)
+
+    # Zielkoordinaten holen mit Adressprüfung (Reihenfolge bleibt erhalten):
+    # Cache-Treffer direkt, nur fehlende Adressen gehen parallel an Nominatim
+    results = [geocode_cache_lookup(key) for key in norm_keys]
+    futures = {
+        EXECUTOR.submit(geocode_cache_miss, addr, norm_keys[idx]): idx
+        for idx, addr in enumerate(user_addresses) if results[idx] is None
+    }
+    for future in as_completed(futures):
+        try:
+            results[futures[future]] = future.result()
+        except Exception:
+            pass
 
-    # Zielkoordinaten holen mit Adressprüfung
     coords_user = []
     valid_addresses = []
+    valid_keys = []
     invalid_addresses = []
 
-    for addr in user_addresses:
-        try:
-            lat, lon = geocode_address(addr)
-            coords_user.append((lat, lon))
-            valid_addresses.append(addr)
-        except Exception:
+    for addr, key, coord in zip(user_addresses, norm_keys, results):
+        if coord is None:
             invalid_addresses.append(addr)
+        else:
+            coords_user.append(coord)
+            valid_addresses.append(addr)
+            valid_keys.append(key)
 
     if len(coords_user) == 0:
-        return jsonify({
+        return ojson({
             "error": "Keine gültigen Adressen gefunden.",
             "invalid_addresses": invalid_addresses
-        }), 400
+        }, 400)
 
     # Gesamtliste (Index 0 = Depot, ab 1 = Kunden)
     coords = [(start_lat, start_lon)] + coords_user
     geocoded_addresses = [START_ADDRESS] + valid_addresses
 
-    # Index des festen ersten Stopps suchen (nie 0)
-    norm_map = {norm_for_match(addr): idx for idx, addr in enumerate(geocoded_addresses)}
+    # Index des festen ersten Stopps suchen (nie 0, Kunden beginnen bei Index 1)
+    norm_map = {key: idx for idx, key in enumerate(valid_keys, start=1)}
     fixed_start_idx = norm_map.get(norm_fixed)
 
     if fixed_start_idx is None or fixed_start_idx == 0:
-        return jsonify({"error": "Fester erster Stopp konnte nicht eindeutig zugeordnet werden."}), 400
+        return ojson({"error": "Fester erster Stopp konnte nicht eindeutig zugeordnet werden."}, 400)
 
     # OSRM-Matrix abrufen
     try:
         distances, durations = get_osrm_table(coords)
     except Exception as e:
-        return jsonify({"error": f"Fehler bei der OSRM-Matrix: {e}"}), 500
+        return ojson({"error": f"Fehler bei der OSRM-Matrix: {e}"}, 500)
 
     n_points = len(coords)
 
@@ -314,61 +790,43 @@ def optimize():
         order = [0, 1, 0]
         solver_used = "greedy"
     else:
-        # Wir bauen ein Teilproblem: fester erster Stopp ist "Depot" im Teilproblem.
-        # Knotenmenge: [fixed_start_idx] + alle anderen Kunden (1..n-1) außer fixed_start_idx
-        sub_nodes = [fixed_start_idx] + [i for i in range(1, n_points) if i != fixed_start_idx]
-
-        # Teil-Distanzmatrix aufbauen
-        m = len(sub_nodes)
-        sub_distances = [[0] * m for _ in range(m)]
-        for i in range(m):
-            for j in range(m):
-                sub_distances[i][j] = distances[sub_nodes[i]][sub_nodes[j]]
-
-        # TSP nur über das Teilproblem
-        use_ortools = HAS_OR_TOOLS and m <= 25
+        # Alle Solver arbeiten auf derselben endlichen Kostenmatrix
+        costs = cost_matrix(distances)
+
+        # Fester erster Stopp wird direkt im Solver erzwungen (Depot -> fixed_start_idx)
+        use_ortools = HAS_OR_TOOLS and n_points <= 26  # Depot + bis zu 25 Stopps
         solver_used = "ortools" if use_ortools else "greedy"
 
-        if use_ortools:
-            sub_order = ortools_tsp(sub_distances, roundtrip=True)
-            if sub_order is None:
+        if n_points <= HELD_KARP_MAX_NODES:
+            solver_used = "held-karp"
+            order = held_karp_tsp(costs, first_stop_idx=fixed_start_idx)
+        elif use_ortools:
+            order = ortools_tsp(costs, roundtrip=True, first_stop_idx=fixed_start_idx)
+            if order is None:
                 solver_used = "greedy"
-                sub_order = greedy_tsp(sub_distances, roundtrip=True)
+                order = greedy_tsp(costs, roundtrip=True, first_stop_idx=fixed_start_idx)
         else:
-            sub_order = greedy_tsp(sub_distances, roundtrip=True)
+            order = greedy_tsp(costs, roundtrip=True, first_stop_idx=fixed_start_idx)
 
-        # sub_order sind Indizes in sub_nodes; 0 entspricht fixed_start_idx
-        # Wir bauen globale Reihenfolge:
-        global_order = [0]  # Depot zuerst
-        used = set(global_order)
+        if solver_used == "greedy":
+            order = two_opt_tsp(order, costs, first=2)
 
-        for k in sub_order:
-            node = sub_nodes[k]
-            if node not in used:
-                global_order.append(node)
-                used.add(node)
+    # Distanz & Zeit über alle Kanten der Tour summieren
+    order_arr = np.asarray(order)
+    total_distance = float(distances[order_arr[:-1], order_arr[1:]].sum())
+    total_duration = float(durations[order_arr[:-1], order_arr[1:]].sum())
 
-        # Am Ende zurück zum Depot
-        if global_order[-1] != 0:
-            global_order.append(0)
-
-        order = global_order
-
-    # Distanz & Zeit summieren
-    total_distance = 0
-    total_duration = 0
-
-    for i in range(len(order) - 1):
-        a = order[i]
-        b = order[i + 1]
-        total_distance += distances[a][b]
-        total_duration += durations[a][b]
+    # NaN/inf: mindestens eine Kante der Tour ist laut OSRM nicht erreichbar
+    if not (np.isfinite(total_distance) and np.isfinite(total_duration)):
+        return ojson({
+            "error": "OSRM findet für mindestens einen Abschnitt der Tour keine Straßenverbindung."
+        }, 400)
 
     # OSRM-Route holen
     try:
         route = get_osrm_route(coords, order)
     except Exception as e:
-        return jsonify({"error": f"Fehler bei der Routenberechnung: {e}"}), 500
+        return ojson({"error": f"Fehler bei der Routenberechnung: {e}"}, 500)
 
     # Ausgabe formatieren
     ordered_list = []
@@ -381,7 +839,7 @@ def optimize():
             "is_start": (i == 0)
         })
 
-    return jsonify({
+    response = ojson({
         "start_address": START_ADDRESS,
         "ordered_stops": ordered_list,
         "total_distance_km": round(total_distance / 1000, 2),
@@ -391,6 +849,24 @@ def optimize():
         "invalid_addresses": invalid_addresses,
         "solver": solver_used
     })
+    # Ungültige Adressen können auch an 429/Timeouts liegen -> solche Antworten nicht cachen
+    if not invalid_addresses:
+        cache_set(cache_key, response.get_data(), OPTIMIZE_CACHE_TTL)
+    return response
+
+
+@app.cli.command("cache-clear")
+@click.argument("prefix", default="opt:")
+def cache_clear_command(prefix):
+    """Cache-Einträge mit PREFIX löschen (Standard: gecachte /optimize-Antworten)."""
+    cache_clear(prefix)
+    click.echo(f"Cache-Einträge mit Präfix '{prefix}' gelöscht.")
+
+
+# JIT-Kompilierung beim Start statt bei der ersten Anfrage
+if HAS_NUMBA:
+    two_opt_tsp([0, 1, 2, 0], np.ones((3, 3)))
+    held_karp_tsp(np.ones((3, 3)), first_stop_idx=1)
 
 
 if __name__ == "__main__":